@@ -0,0 +1,155 @@
+import numpy as np
+from numba import njit
+
+
+def lag(values):
+    """
+    Shifts values one bar forward in place, like pandas' .shift(1), and returns them.
+    """
+    values[1:] = values[:-1]
+    values[0] = np.nan
+    return values
+
+
+@njit(cache=True)
+def sma_nb(close, window):
+    """
+    Simple moving average, NaN until `window` values are available.
+
+    Uses the same Kahan-compensated running sum as pandas' rolling mean so results match ta/pandas.
+    """
+    n = len(close)
+    out = np.empty(n)
+    sum_x = 0.0
+    compensation_add = 0.0
+    compensation_remove = 0.0
+    n_same = 0
+    prev_value = np.nan
+
+    for i in range(n):
+        if i >= window:
+            y = -close[i - window] - compensation_remove
+            t = sum_x + y
+            compensation_remove = t - sum_x - y
+            sum_x = t
+
+        val = close[i]
+        y = val - compensation_add
+        t = sum_x + y
+        compensation_add = t - sum_x - y
+        sum_x = t
+        if val == prev_value:
+            n_same += 1
+        else:
+            n_same = 1
+        prev_value = val
+
+        nobs = min(i + 1, window)
+        if nobs < window:
+            out[i] = np.nan
+        elif n_same >= nobs:
+            out[i] = prev_value
+        else:
+            out[i] = sum_x / nobs
+    return out
+
+
+@njit(cache=True)
+def ema_nb(close, window):
+    """
+    Exponential moving average with alpha = 2 / (window + 1), NaN until `window` values are available.
+
+    Follows pandas' ewm(span=window, adjust=False) recurrence.
+    """
+    n = len(close)
+    out = np.empty(n)
+    com = (window - 1) / 2.0
+    alpha = 1.0 / (1.0 + com)
+    old_wt_factor = 1.0 - alpha
+
+    weighted = close[0]
+    for i in range(n):
+        cur = close[i]
+        if i > 0 and weighted != cur:
+            weighted = old_wt_factor * weighted + alpha * cur
+            weighted /= old_wt_factor + alpha
+        out[i] = weighted if i + 1 >= window else np.nan
+    return out
+
+
+@njit(cache=True)
+def _pairwise_sum(a):
+    # same summation order as numpy's sum, so the weighted windows match ta's rolling apply
+    n = len(a)
+    if n < 8:
+        res = 0.0
+        for i in range(n):
+            res += a[i]
+        return res
+    elif n <= 128:
+        r = a[:8].copy()
+        i = 8
+        while i < n - (n % 8):
+            for j in range(8):
+                r[j] += a[i + j]
+            i += 8
+        res = ((r[0] + r[1]) + (r[2] + r[3])) + ((r[4] + r[5]) + (r[6] + r[7]))
+        while i < n:
+            res += a[i]
+            i += 1
+        return res
+    n2 = n // 2
+    n2 -= n2 % 8
+    return _pairwise_sum(a[:n2]) + _pairwise_sum(a[n2:])
+
+
+@njit(cache=True)
+def wma_nb(close, window):
+    """
+    Weighted moving average with linear weights 1..window, NaN until `window` values are available.
+    """
+    n = len(close)
+    out = np.full(n, np.nan)
+    weights = np.empty(window)
+    for j in range(window):
+        weights[j] = (j + 1) * 2 / (window * (window + 1))
+
+    for i in range(window - 1, n):
+        out[i] = _pairwise_sum(weights * close[i - window + 1:i + 1])
+    return out
+
+
+@njit(cache=True)
+def donchian_mid_nb(high, low, window):
+    """
+    Donchian channel middle band, NaN until `window` values are available.
+
+    Rolling max/min are tracked with monotonic deques, O(n) whatever the window.
+    """
+    n = len(high)
+    out = np.full(n, np.nan)
+    max_deque = np.empty(n, dtype=np.int64)
+    min_deque = np.empty(n, dtype=np.int64)
+    max_head = max_tail = 0
+    min_head = min_tail = 0
+
+    for i in range(n):
+        while max_tail > max_head and high[max_deque[max_tail - 1]] <= high[i]:
+            max_tail -= 1
+        max_deque[max_tail] = i
+        max_tail += 1
+        if max_deque[max_head] <= i - window:
+            max_head += 1
+
+        while min_tail > min_head and low[min_deque[min_tail - 1]] >= low[i]:
+            min_tail -= 1
+        min_deque[min_tail] = i
+        min_tail += 1
+        if min_deque[min_head] <= i - window:
+            min_head += 1
+
+        if i + 1 >= window:
+            hband = high[max_deque[max_head]]
+            lband = low[min_deque[min_head]]
+            out[i] = ((hband - lband) / 2.0) + lband
+    return out
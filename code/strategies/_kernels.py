@@ -0,0 +1,487 @@
+from collections import namedtuple
+
+import numpy as np
+from numba import njit, prange
+from numba.cpython.unsafe.numbers import trailing_zeros
+
+LONG = 1
+SHORT = -1
+
+# position sizing modes
+SIZE_PERCENTAGE = 0
+SIZE_EXPOSURE = 1
+SIZE_FIXED = 2
+
+# columns of the (n_bars, 4) ohlc price tile
+OPEN, HIGH, LOW, CLOSE = 0, 1, 2, 3
+
+# band triggers are packed into one uint64 bitfield per bar
+MAX_ENVELOPES = 64
+
+# one record per closed trade, filled by the kernels
+TRADE_DTYPE = np.dtype([
+    ("open_idx", np.int64),
+    ("close_idx", np.int64),
+    ("side", np.int64),
+    ("open_reason", np.int64),
+    ("close_reason", np.int64),
+    ("open_price", np.float64),
+    ("close_price", np.float64),
+    ("initial_margin", np.float64),
+    ("net_pnl", np.float64),
+    ("net_pnl_pct", np.float64),
+    ("open_notional_value", np.float64),
+    ("close_notional_value", np.float64),
+    ("amount", np.float64),
+    ("open_fee", np.float64),
+    ("close_fee", np.float64),
+    ("sl_price", np.float64),
+    ("tp_price", np.float64),
+    ("liquidation_price", np.float64),
+    ("open_balance", np.float64),
+    ("close_balance", np.float64),
+])
+
+# one record per equity update, filled by the kernels
+EQUITY_DTYPE = np.dtype([
+    ("idx", np.int64),
+    ("price", np.float64),
+    ("equity", np.float64),
+])
+
+# one record per parameter set of an envelope sweep
+SWEEP_PARAMS_DTYPE = np.dtype([
+    ("average_idx", np.int64),
+    ("n_envelopes", np.int64),
+    ("stop_loss_pct", np.float64),
+    ("price_jump_pct", np.float64),
+    ("position_size", np.float64),
+    ("position_size_is_fraction", np.bool_),
+    ("ignore_longs", np.bool_),
+    ("ignore_shorts", np.bool_),
+])
+
+SWEEP_RESULT_DTYPE = np.dtype([
+    ("final_equity", np.float64),
+    ("total_trades", np.int64),
+    ("liquidation_idx", np.int64),
+])
+
+# Immutable counterpart of tools.Position, passed by value through the kernels.
+# `side` is kept after closing (like Position.is_long), `is_open` plays the role of Position.side.
+PositionState = namedtuple(
+    "PositionState",
+    [
+        "is_open",
+        "side",
+        "open_idx",
+        "open_reason",
+        "open_price",
+        "initial_margin",
+        "open_notional_value",
+        "open_fee",
+        "amount",
+        "sl_price",
+        "tp_price",
+        "liquidation_price",
+    ],
+)
+
+
+@njit(cache=True)
+def _empty_position():
+    return PositionState(False, 0, -1, -1, np.nan, 0.0, 0.0, 0.0, 0.0, np.nan, np.nan, np.nan)
+
+
+@njit(cache=True)
+def _liquidation_price(side, price, leverage):  ### approximated computation, check exchange specifics.
+    if side == LONG:
+        return price * (1 - 1 / leverage)
+    return price * (1 + 1 / leverage)
+
+
+@njit(cache=True)
+def _pnl(pos, price):
+    if pos.side == LONG:
+        return pos.amount * (price - pos.open_price)
+    return pos.amount * (pos.open_price - price)
+
+
+@njit(cache=True)
+def _opening_metrics(initial_margin, price, leverage, open_fee_rate):
+    open_notional_value = initial_margin * leverage
+    open_fee = open_notional_value * open_fee_rate
+    open_notional_value -= open_fee
+    amount = open_notional_value / price
+    return open_notional_value, open_fee, amount
+
+
+@njit(cache=True)
+def _open_position(idx, side, initial_margin, price, reason, sl_price, tp_price, leverage, open_fee_rate):
+    open_notional_value, open_fee, amount = _opening_metrics(initial_margin, price, leverage, open_fee_rate)
+    return PositionState(
+        True, side, idx, reason, price, initial_margin, open_notional_value, open_fee, amount,
+        sl_price, tp_price, _liquidation_price(side, price, leverage),
+    )
+
+
+@njit(cache=True)
+def _add_to_position(pos, initial_margin, price, reason, leverage, open_fee_rate):
+    open_notional_value, open_fee, amount = _opening_metrics(initial_margin, price, leverage, open_fee_rate)
+    open_price = (pos.open_price * pos.amount + price * amount) / (pos.amount + amount)
+    return PositionState(
+        pos.is_open, pos.side, pos.open_idx, reason, open_price,
+        pos.initial_margin + initial_margin,
+        pos.open_notional_value + open_notional_value,
+        pos.open_fee + open_fee,
+        pos.amount + amount,
+        pos.sl_price, pos.tp_price, _liquidation_price(pos.side, open_price, leverage),
+    )
+
+
+@njit(cache=True)
+def _with_sl_price(pos, sl_price):
+    return PositionState(
+        pos.is_open, pos.side, pos.open_idx, pos.open_reason, pos.open_price, pos.initial_margin,
+        pos.open_notional_value, pos.open_fee, pos.amount, sl_price, pos.tp_price, pos.liquidation_price,
+    )
+
+
+@njit(cache=True)
+def _close_position(trades, n_trades, pos, idx, price, reason, close_fee_rate, balance):
+    pnl = _pnl(pos, price)
+    close_notional_value = pos.open_notional_value + pnl
+    close_fee = close_notional_value * close_fee_rate
+    net_pnl = pnl - pos.open_fee - close_fee
+    close_balance = balance + (pos.initial_margin + net_pnl)
+
+    row = trades[n_trades]
+    row.open_idx = pos.open_idx
+    row.close_idx = idx
+    row.side = pos.side
+    row.open_reason = pos.open_reason
+    row.close_reason = reason
+    row.open_price = pos.open_price
+    row.close_price = price
+    row.initial_margin = pos.initial_margin
+    row.net_pnl = net_pnl
+    row.net_pnl_pct = net_pnl / pos.initial_margin * 100
+    row.open_notional_value = pos.open_notional_value
+    row.close_notional_value = close_notional_value
+    row.amount = pos.amount
+    row.open_fee = pos.open_fee
+    row.close_fee = close_fee
+    row.sl_price = pos.sl_price
+    row.tp_price = pos.tp_price
+    row.liquidation_price = pos.liquidation_price
+    row.open_balance = balance
+    row.close_balance = close_balance
+
+    closed = PositionState(
+        False, pos.side, pos.open_idx, pos.open_reason, pos.open_price, pos.initial_margin,
+        pos.open_notional_value, pos.open_fee, pos.amount, pos.sl_price, pos.tp_price, pos.liquidation_price,
+    )
+    return closed, close_balance
+
+
+@njit(cache=True)
+def _record_equity(equity, n_equity, pos, idx, balance, price, close_fee_rate):
+    value = balance
+    if pos.is_open:
+        unrealized_pnl = _pnl(pos, price)
+        close_fee = (pos.open_notional_value + unrealized_pnl) * close_fee_rate
+        value += pos.initial_margin + unrealized_pnl - pos.open_fee - close_fee
+
+    row = equity[n_equity]
+    row.idx = idx
+    row.price = price
+    row.equity = value
+
+
+@njit(cache=True)
+def equity_update_indices(times, interval):
+    """
+    Bars at which the equity is recorded: the first one, then each first bar at least `interval` after the
+    previous record. `times` are the sorted bar timestamps and `interval` a duration, both in ns.
+    """
+    n = len(times)
+    indices = np.empty(n, dtype=np.int64)
+    n_updates = 0
+    i = 0
+    while i < n:
+        indices[n_updates] = i
+        n_updates += 1
+        i = max(i + 1, np.searchsorted(times, times[i] + interval))
+    return indices[:n_updates]
+
+
+@njit(cache=True)
+def run_envelope_kernel(
+        equity_idx, ohlc, average, band_low, band_high,
+        close_long_sig, close_short_sig, open_long_mask, open_short_mask, params_tuple, trades, equity,
+):
+    """
+    Bar loop of the envelope strategy.
+
+    `ohlc` is a C-contiguous (n_bars, 4) tile (see tools.ohlc_tile), so the prices of a bar share a cache line.
+
+    `open_long_mask`/`open_short_mask` hold one uint64 per bar, bit j being set when envelope j is triggered
+    (see tools.band_mask), so only the triggered bands are visited.
+
+    Close reasons are encoded as 0: "CA", 1: "SL", 2: "Exit", open reasons as the envelope index.
+    The equity is recorded at the bars listed in `equity_idx` (see equity_update_indices).
+    Closed trades and equity updates are written into the preallocated `trades` (TRADE_DTYPE, length n_bars)
+    and `equity` (EQUITY_DTYPE, length len(equity_idx)) buffers.
+    Returns (n_trades, n_equity, balance, position, liquidation_idx), liquidation_idx being -1 if no liquidation happened.
+    `average` and the band matrices may be float32 or float64, prices are widened to float64 when used.
+    """
+    (initial_balance, leverage, open_fee_rate, close_fee_rate, sl_long_factor, sl_short_factor, price_jump_pct,
+     position_size, position_size_is_fraction, ignore_longs, ignore_shorts) = params_tuple
+
+    n_bars, n_envelopes = band_low.shape
+    n_trades = 0
+    n_equity = 0
+
+    check_price_jump = not np.isnan(price_jump_pct)
+    balance = initial_balance
+    pos = _empty_position()
+    good_to_trade = True
+    n_bands_hit = 0
+    last_position_side = 0
+
+    for i in range(n_bars):
+        position_was_closed = False
+        if not good_to_trade:
+            if last_position_side == LONG and ohlc[i, CLOSE] > average[i]:
+                good_to_trade = True
+            elif last_position_side == SHORT and ohlc[i, CLOSE] < average[i]:
+                good_to_trade = True
+
+        if pos.is_open and pos.side == LONG:
+            if check_price_jump and ohlc[i, OPEN] <= pos.open_price * (1 - price_jump_pct):
+                pos, balance = _close_position(trades, n_trades, pos, i, ohlc[i, OPEN], 0, close_fee_rate, balance)
+                n_trades += 1
+                good_to_trade = False
+                n_bands_hit = 0
+
+            elif ohlc[i, LOW] <= pos.sl_price:
+                pos, balance = _close_position(trades, n_trades, pos, i, pos.sl_price, 1, close_fee_rate, balance)
+                n_trades += 1
+                good_to_trade = False
+                n_bands_hit = 0
+
+            elif ohlc[i, LOW] <= pos.liquidation_price:
+                return n_trades, n_equity, balance, pos, i
+
+            elif close_long_sig[i]:
+                pos, balance = _close_position(trades, n_trades, pos, i, np.float64(average[i]), 2, close_fee_rate, balance)
+                n_trades += 1
+                position_was_closed = True
+                n_bands_hit = 0
+
+        elif pos.is_open and pos.side == SHORT:
+            if check_price_jump and ohlc[i, OPEN] >= pos.open_price * (1 + price_jump_pct):
+                pos, balance = _close_position(trades, n_trades, pos, i, ohlc[i, OPEN], 0, close_fee_rate, balance)
+                n_trades += 1
+                good_to_trade = False
+                n_bands_hit = 0
+
+            elif ohlc[i, HIGH] >= pos.sl_price:
+                pos, balance = _close_position(trades, n_trades, pos, i, pos.sl_price, 1, close_fee_rate, balance)
+                n_trades += 1
+                good_to_trade = False
+                n_bands_hit = 0
+
+            elif ohlc[i, HIGH] >= pos.liquidation_price:
+                return n_trades, n_equity, balance, pos, i
+
+            elif close_short_sig[i]:
+                pos, balance = _close_position(trades, n_trades, pos, i, np.float64(average[i]), 2, close_fee_rate, balance)
+                n_trades += 1
+                position_was_closed = True
+                n_bands_hit = 0
+
+        if good_to_trade and not position_was_closed and n_bands_hit < n_envelopes:
+            wallet = balance
+            # triggered bands from n_bands_hit onwards, visited in envelope order by their lowest set bit
+            pending = (open_long_mask[i] | open_short_mask[i]) >> np.uint64(n_bands_hit) << np.uint64(n_bands_hit)
+            while pending != 0:
+                j = np.int64(trailing_zeros(pending))
+                bit = np.uint64(1) << np.uint64(j)
+                pending ^= bit
+
+                if not ignore_longs and not (pos.is_open and pos.side == SHORT) and open_long_mask[i] & bit:
+                    side = LONG
+                    price = np.float64(band_low[i, j])
+                    sl_factor = sl_long_factor
+                elif not ignore_shorts and not (pos.is_open and pos.side == LONG) and open_short_mask[i] & bit:
+                    side = SHORT
+                    price = np.float64(band_high[i, j])
+                    sl_factor = sl_short_factor
+                else:
+                    continue
+
+                last_position_side = side
+                initial_margin = wallet * position_size if position_size_is_fraction else position_size
+                balance -= initial_margin
+                n_bands_hit += 1
+
+                if j == 0:
+                    pos = _open_position(
+                        i, side, initial_margin, price, j, price * sl_factor, np.nan, leverage, open_fee_rate,
+                    )
+                else:
+                    pos = _add_to_position(pos, initial_margin, price, j, leverage, open_fee_rate)
+                    pos = _with_sl_price(pos, pos.open_price * sl_factor)
+
+        if n_equity < len(equity_idx) and i == equity_idx[n_equity]:
+            _record_equity(equity, n_equity, pos, i, balance, ohlc[i, CLOSE], close_fee_rate)
+            n_equity += 1
+
+    return n_trades, n_equity, balance, pos, -1
+
+
+@njit(cache=True)
+def run_sma_kernel(
+        equity_idx, ohlc, close_long_sig, close_short_sig, open_long_sig, open_short_sig,
+        params_tuple, trades, equity,
+):
+    """
+    Bar loop of the simple sma strategy, `ohlc` being laid out as in run_envelope_kernel.
+
+    Close reasons are encoded as 0: "SL", 1: "TP", 2: "Exit".
+    Stop loss and take profit prices are the entry (close) price times the sl/tp factors of `params_tuple`.
+    The equity is recorded at the bars listed in `equity_idx` (see equity_update_indices).
+    Closed trades and equity updates are written into the preallocated `trades` (TRADE_DTYPE, length n_bars)
+    and `equity` (EQUITY_DTYPE, length len(equity_idx)) buffers.
+    Returns (n_trades, n_equity, balance, position, liquidation_idx), liquidation_idx being -1 if no liquidation happened.
+    """
+    (initial_balance, leverage, open_fee_rate, close_fee_rate, position_size_mode, position_size,
+     ignore_longs, ignore_shorts, long_sl_factor, long_tp_factor, short_sl_factor, short_tp_factor) = params_tuple
+
+    n_bars = len(ohlc)
+    n_trades = 0
+    n_equity = 0
+
+    balance = initial_balance
+    pos = _empty_position()
+
+    for i in range(n_bars):
+        if pos.is_open and pos.side == LONG:
+            if ohlc[i, LOW] <= pos.sl_price:
+                pos, balance = _close_position(trades, n_trades, pos, i, pos.sl_price, 0, close_fee_rate, balance)
+                n_trades += 1
+
+            elif ohlc[i, LOW] <= pos.liquidation_price:
+                return n_trades, n_equity, balance, pos, i
+
+            elif ohlc[i, HIGH] >= pos.tp_price:
+                pos, balance = _close_position(trades, n_trades, pos, i, pos.tp_price, 1, close_fee_rate, balance)
+                n_trades += 1
+
+            elif close_long_sig[i]:
+                pos, balance = _close_position(trades, n_trades, pos, i, ohlc[i, CLOSE], 2, close_fee_rate, balance)
+                n_trades += 1
+
+        elif pos.is_open and pos.side == SHORT:
+            if ohlc[i, HIGH] >= pos.sl_price:
+                pos, balance = _close_position(trades, n_trades, pos, i, pos.sl_price, 0, close_fee_rate, balance)
+                n_trades += 1
+
+            elif ohlc[i, HIGH] >= pos.liquidation_price:
+                return n_trades, n_equity, balance, pos, i
+
+            elif ohlc[i, LOW] <= pos.tp_price:
+                pos, balance = _close_position(trades, n_trades, pos, i, pos.tp_price, 1, close_fee_rate, balance)
+                n_trades += 1
+
+            elif close_short_sig[i]:
+                pos, balance = _close_position(trades, n_trades, pos, i, ohlc[i, CLOSE], 2, close_fee_rate, balance)
+                n_trades += 1
+
+        else:
+            price = ohlc[i, CLOSE]
+            side = 0
+            sl_price = tp_price = np.nan
+            if not ignore_longs and open_long_sig[i]:
+                side = LONG
+                sl_price = price * long_sl_factor
+                tp_price = price * long_tp_factor
+            elif not ignore_shorts and open_short_sig[i]:
+                side = SHORT
+                sl_price = price * short_sl_factor
+                tp_price = price * short_tp_factor
+
+            if side != 0:
+                if position_size_mode == SIZE_PERCENTAGE:  # total wallet percentage position size
+                    initial_margin = balance * position_size / 100
+                elif position_size_mode == SIZE_EXPOSURE:  # risk adjusted (sl) position size
+                    amount_at_risk = balance * position_size / 100
+                    initial_margin = amount_at_risk * price / abs(price - sl_price)
+                else:  # fixed amount position size
+                    initial_margin = position_size
+                balance -= initial_margin
+                pos = _open_position(i, side, initial_margin, price, 0, sl_price, tp_price, leverage, open_fee_rate)
+
+        if n_equity < len(equity_idx) and i == equity_idx[n_equity]:
+            _record_equity(equity, n_equity, pos, i, balance, ohlc[i, CLOSE], close_fee_rate)
+            n_equity += 1
+
+    return n_trades, n_equity, balance, pos, -1
+
+
+@njit(cache=True, parallel=True)
+def run_envelope_sweep(equity_idx, ohlc, averages, envelopes, sweep_params, base_params):
+    """
+    Runs the envelope bar loop for every parameter set of `sweep_params` (SWEEP_PARAMS_DTYPE), in parallel.
+
+    `averages` holds one lagged average per row, selected by average_idx, and `envelopes` one (zero padded)
+    envelope list per parameter set. Bands and signals are built per thread, exactly like populate_indicators
+    and populate_*_signals do. Returns one SWEEP_RESULT_DTYPE record per parameter set.
+    """
+    initial_balance, leverage, open_fee_rate, close_fee_rate = base_params
+    n_bars = len(ohlc)
+    n_params = len(sweep_params)
+    results = np.empty(n_params, dtype=SWEEP_RESULT_DTYPE)
+
+    for p in prange(n_params):
+        sp = sweep_params[p]
+        average = averages[sp.average_idx]
+        n_envelopes = sp.n_envelopes
+
+        band_high = np.empty((n_bars, n_envelopes))
+        band_low = np.empty((n_bars, n_envelopes))
+        open_long_mask = np.zeros(n_bars, dtype=np.uint64)
+        open_short_mask = np.zeros(n_bars, dtype=np.uint64)
+        close_long_sig = np.zeros(n_bars, dtype=np.bool_)
+        close_short_sig = np.zeros(n_bars, dtype=np.bool_)
+        for i in range(n_bars):
+            if not sp.ignore_longs:
+                close_long_sig[i] = ohlc[i, HIGH] >= average[i]
+            if not sp.ignore_shorts:
+                close_short_sig[i] = ohlc[i, LOW] <= average[i]
+            for j in range(n_envelopes):
+                band_high[i, j] = average[i] / (1 - envelopes[p, j])
+                band_low[i, j] = average[i] * (1 - envelopes[p, j])
+                if not sp.ignore_longs and ohlc[i, LOW] <= band_low[i, j]:
+                    open_long_mask[i] |= np.uint64(1) << np.uint64(j)
+                if not sp.ignore_shorts and ohlc[i, HIGH] >= band_high[i, j]:
+                    open_short_mask[i] |= np.uint64(1) << np.uint64(j)
+
+        params_tuple = (
+            initial_balance, leverage, open_fee_rate, close_fee_rate, 1 - sp.stop_loss_pct, 1 + sp.stop_loss_pct, sp.price_jump_pct,
+            sp.position_size, sp.position_size_is_fraction, sp.ignore_longs, sp.ignore_shorts,
+        )
+        trades = np.empty(n_bars, dtype=TRADE_DTYPE)
+        equity = np.empty(len(equity_idx), dtype=EQUITY_DTYPE)
+        n_trades, n_equity, balance, pos, liquidation_idx = run_envelope_kernel(
+            equity_idx, ohlc, average, band_low, band_high,
+            close_long_sig, close_short_sig, open_long_mask, open_short_mask, params_tuple, trades, equity,
+        )
+
+        result = results[p]
+        result.final_equity = equity[n_equity - 1].equity if liquidation_idx < 0 and n_equity > 0 else np.nan
+        result.total_trades = n_trades
+        result.liquidation_idx = liquidation_idx
+
+    return results
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+_warmed_up = False
+
+
+def warmup() -> None:
+    """
+    Compiles every Numba kernel (or loads it from the on-disk cache) by running both strategies on a tiny dummy
+    dataset, so that the first real backtest does not pay the JIT latency.
+    """
+    global _warmed_up
+    if _warmed_up:
+        return
+
+    from . import envelope, simple_sma
+
+    n = 64
+    close = 100 + 10 * np.sin(np.arange(n) / 4)
+    ohlcv = pd.DataFrame(
+        {"open": close, "high": close * 1.05, "low": close * 0.95, "close": close, "volume": np.ones(n)},
+        index=pd.date_range("2020-01-01", periods=n, freq="1h"),
+    )
+
+    sweep_params = []
+    for average_type in ("SMA", "EMA", "WMA", "DCM"):
+        params = {
+            "average_type": average_type,
+            "average_period": 5,
+            "envelopes": [0.03, 0.05],
+            "stop_loss_pct": 0.1,
+            "position_size_percentage": 100,
+        }
+        envelope.Strategy(params, ohlcv).run_backtest(
+            initial_balance=1000, leverage=1, open_fee_rate=0.0002, close_fee_rate=0.0006)
+        sweep_params.append(params)
+    envelope.Strategy.run_sweep(
+        sweep_params, ohlcv, initial_balance=1000, leverage=1, open_fee_rate=0.0002, close_fee_rate=0.0006)
+
+    params = {"fast_ma_period": 3, "slow_ma_period": 5, "trend_ma_period": 8, "position_size_percentage": 100}
+    simple_sma.Strategy(params, ohlcv).run_backtest(initial_balance=1000, leverage=1, fee_rate=0.0006)
+
+    _warmed_up = True
@@ -1,34 +1,47 @@
 import sys
-import ta
+import numpy as np
 import pandas as pd
-from datetime import datetime
 
 from . import tools as ut
+from . import _kernels as kernels
+from . import _indicators as ind
+from . import _warmup
 
 
 class Strategy:
-    def __init__(self, params, ohlcv) -> None:
+    def __init__(self, params, ohlcv, warmup=False, indicator_dtype=np.float64) -> None:
+        if warmup:  # compile the Numba kernels upfront
+            _warmup.warmup()
+
         self.params = params
-        self.data = ohlcv.copy()
+        self._n_envelopes = _n_envelopes(self.params)
+        # np.float32 halves the average/band memory at the cost of ~1e-7 relative price precision
+        self.indicator_dtype = np.dtype(indicator_dtype)
+        # shallow copy: the OHLCV buffers are shared with the caller, who must not modify them in place,
+        # while the indicator and signal columns are only added to self.data
+        self.data = ohlcv.copy(deep=False)
 
         self.populate_indicators()
         self.set_trade_mode()
-        self.good_to_trade = True
-        self.position_was_closed = False
-        self.n_bands_hit = 0
-        self.last_position_side = None
+
+        # constant per-band settings, resolved once instead of at every backtest
+        self._price_jump_pct = self.params.get("price_jump_pct")
+        self._sl_long_factor = 1 - self.params["stop_loss_pct"]
+        self._sl_short_factor = 1 + self.params["stop_loss_pct"]
+        self._sizing = None  # (position size per band, is a wallet fraction), resolved by the first backtest
+        self._open_reasons = [f"Open {{side}} {i + 1}" for i in range(self._n_envelopes)]
 
     # --- Trade Mode ---
     def set_trade_mode(self):
         self.params.setdefault("mode", "both")
-
-        valid_modes = ("long", "short", "both")
-        if self.params["mode"] not in valid_modes:
-            raise ValueError(f"Wrong strategy mode. Can either be {', '.join(valid_modes)}.")
+        _validate_mode(self.params["mode"])
 
         self.ignore_shorts = self.params["mode"] == "long"
         self.ignore_longs = self.params["mode"] == "short"
 
+        # open signals of an ignored side never trigger
+        self.open_long = np.zeros(self.band_low.shape, dtype=bool)
+        self.open_short = np.zeros(self.band_high.shape, dtype=bool)
         if not self.ignore_longs:
             self.populate_long_signals()
         if not self.ignore_shorts:
@@ -36,166 +49,131 @@ class Strategy:
 
     # --- Indicators ---
     def populate_indicators(self):
-        # https://technical-analysis-library-in-python.readthedocs.io/en/latest/ta.html
-        if "DCM" == self.params["average_type"]:
-            ta_obj = ta.volatility.DonchianChannel(self.data["high"], self.data["low"], self.data["close"], window=self.params["average_period"])
-            self.data["average"] = ta_obj.donchian_channel_mband().shift(1)
-        elif "SMA" == self.params["average_type"]:
-            self.data["average"] = ta.trend.sma_indicator(self.data["close"], window=self.params["average_period"]).shift(1)
-        elif "EMA" == self.params["average_type"]:
-            self.data["average"] = ta.trend.ema_indicator(self.data["close"], window=self.params["average_period"]).shift(1)
-        elif "WMA" == self.params["average_type"]:
-            self.data["average"] = ta.trend.wma_indicator(self.data["close"], window=self.params["average_period"]).shift(1)
-        else:
-            raise ValueError(f"The average type {self.params['average_type']} is not supported")
-
-        for i, e in enumerate(self.params["envelopes"]):
-            self.data[f"band_high_{i + 1}"] = self.data["average"] / (1 - e)
-            self.data[f"band_low_{i + 1}"] = self.data["average"] * (1 - e)
+        average = compute_average(self.data, self.params["average_type"], self.params["average_period"])
+        average = average.astype(self.indicator_dtype, copy=False)
+        self.data["average"] = average
+
+        # (n_bars, n_envelopes) matrices, column i being the i-th envelope
+        envelopes = np.asarray(self.params["envelopes"], dtype=self.indicator_dtype)
+        self.band_high = average[:, None] / (1 - envelopes[None, :])
+        self.band_low = average[:, None] * (1 - envelopes[None, :])
 
     # --- Long Rules ---
     def populate_long_signals(self):
         self.data["close_long"] = self.data["high"] >= self.data["average"]
-        for i in range(len(self.params["envelopes"])):
-            self.data[f"open_long_{i + 1}"] = self.data["low"] <= self.data[f"band_low_{i + 1}"]
-
-    def calculate_long_sl_price(self, avg_open_price):
-        return avg_open_price * (1 - self.params["stop_loss_pct"])
+        self.open_long = self.data["low"].to_numpy(dtype=np.float64)[:, None] <= self.band_low
 
     # --- Short Rules ---
     def populate_short_signals(self):
         self.data["close_short"] = self.data["low"] <= self.data["average"]
-        for i in range(len(self.params["envelopes"])):
-            self.data[f"open_short_{i + 1}"] = self.data["high"] >= self.data[f"band_high_{i + 1}"]
-
-    def calculate_short_sl_price(self, avg_open_price):
-        return avg_open_price * (1 + self.params["stop_loss_pct"])
-
-    # --- Positions ---
-    def evaluate_orders(self, time, row):
-        self.position_was_closed = False
-        if not self.good_to_trade:
-            if self.last_position_side == 'long' and row["close"] > row["average"]:
-                self.good_to_trade = True
-            elif self.last_position_side == 'short' and row["close"] < row["average"]:
-                self.good_to_trade = True
-
-        if self.position.side == "long":
-            if "price_jump_pct" in self.params and row['open'] <= self.position.open_price * (1 - self.params['price_jump_pct']):
-                self.close_trade(time, row['open'], "CA long")
-                self.good_to_trade = False
-                self.n_bands_hit = 0
-                
-            elif self.position.check_for_sl(row):
-                self.close_trade(time, self.position.sl_price, "SL long")
-                self.good_to_trade = False
-                self.n_bands_hit = 0
-                
-            elif self.position.check_for_liquidation(row):
-                print(f"Your long was liquidated on the {time} (price = {self.position.liquidation_price})")
-                sys.exit()
-
-            elif row["close_long"]:
-                self.close_trade(time,  row["average"], "Exit long")
-                self.position_was_closed = True
-                self.n_bands_hit = 0
-
-        elif self.position.side == "short":
-            if "price_jump_pct" in self.params and row['open'] >= self.position.open_price * (1 + self.params['price_jump_pct']):
-                self.close_trade(time, row['open'], "CA short")
-                self.good_to_trade = False
-                self.n_bands_hit = 0
-                
-            elif self.position.check_for_sl(row):
-                self.close_trade(time, self.position.sl_price, "SL short")
-                self.good_to_trade = False
-                self.n_bands_hit = 0
-                
-            elif self.position.check_for_liquidation(row):
-                print(f"Your short was liquidated on the {time} (price = {self.position.liquidation_price})")
-                sys.exit()
-
-            elif row["close_short"]:
-                self.close_trade(time, row["average"], "Exit short")
-                self.position_was_closed = True
-                self.n_bands_hit = 0
-
-        if self.good_to_trade and not self.position_was_closed:
-            balance = self.balance
-            for i in range(self.n_bands_hit, len(self.params["envelopes"])):
-                if not self.ignore_longs and self.position.side != "short" and row[f"open_long_{i + 1}"]:
-                    side = "long"
-                    price_key = f"band_low_{i + 1}"
-                    sl_price_calc = self.calculate_long_sl_price
-                elif not self.ignore_shorts and self.position.side != "long" and row[f"open_short_{i + 1}"]:
-                    side = "short"
-                    price_key = f"band_high_{i + 1}"
-                    sl_price_calc = self.calculate_short_sl_price
-                else:
-                    continue
-
-                self.last_position_side = side
-                price = row[price_key]
-
-                if 'position_size_percentage' in self.params:  # total wallet fraction position size
-                    initial_margin = balance * round(self.params['position_size_percentage'] / 100 / len(self.params["envelopes"]), 4)
-
-                elif 'position_size_fixed_amount' in self.params:  # fixed amount position size
-                    initial_margin = round(self.params['position_size_fixed_amount'] / len(self.params["envelopes"]), 4)
-
-                self.balance -= initial_margin
-                self.n_bands_hit += 1
-
-                if i == 0:
-                    self.position.open(
-                        time,
-                        side,
-                        initial_margin,
-                        price,
-                        f"Open {side} {i + 1}",
-                        sl_price=sl_price_calc(price),
-                    )
-                else:
-                    self.position.add(initial_margin, price, f"Open {side} {i + 1}")
-                    self.position.sl_price = sl_price_calc(self.position.open_price)
-
-
-    def close_trade(self, time, price, reason):
-        self.position.close(time, price, reason)
-        open_balance = self.balance
-        self.balance += self.position.initial_margin + self.position.net_pnl
-        trade_info = self.position.info()
-        trade_info["open_balance"] = open_balance
-        trade_info["close_balance"] = self.balance
-        del trade_info["tp_price"]
-        self.trades_info.append(trade_info)
+        self.open_short = self.data["high"].to_numpy(dtype=np.float64)[:, None] >= self.band_high
 
     # --- Backtest ---
     def run_backtest(self, initial_balance, leverage, open_fee_rate, close_fee_rate):
         self.initial_balance = initial_balance
-        self.balance = initial_balance
-        self.position = ut.Position(leverage=leverage, open_fee_rate=open_fee_rate, close_fee_rate=close_fee_rate)
         self.equity_update_interval = pd.Timedelta(hours=6)
 
-        self.previous_equity_update_time = datetime(1900, 1, 1)
-        self.trades_info = []
-        self.equity_record = []
-
-        for time, row in self.data.iterrows():
-            self.evaluate_orders(time, row)
-            self.previous_equity_update_time = ut.update_equity_record(
-                time,
-                self.position,
-                self.balance,
-                row["close"],
-                self.previous_equity_update_time,
-                self.equity_update_interval,
-                self.equity_record
+        if self._sizing is None:
+            self._sizing = _resolve_sizing(self.params)
+        position_size, position_size_is_fraction = self._sizing
+
+        params_tuple = (
+            float(initial_balance),
+            float(leverage),
+            float(open_fee_rate),
+            float(close_fee_rate),
+            float(self._sl_long_factor),
+            float(self._sl_short_factor),
+            np.nan if self._price_jump_pct is None else float(self._price_jump_pct),
+            float(position_size),
+            position_size_is_fraction,
+            self.ignore_longs,
+            self.ignore_shorts,
+        )
+
+        equity_idx = kernels.equity_update_indices(self.data.index.asi8, self.equity_update_interval.value)
+        trades, equity = ut.allocate_records(len(self.data), len(equity_idx))
+        n_trades, n_equity, self.balance, self.position, liquidation_idx = kernels.run_envelope_kernel(
+            equity_idx,
+            ut.ohlc_tile(self.data),
+            ut.column_array(self.data, "average", self.indicator_dtype),
+            self.band_low,
+            self.band_high,
+            ut.column_array(self.data, "close_long", bool),
+            ut.column_array(self.data, "close_short", bool),
+            ut.band_mask(self.open_long),
+            ut.band_mask(self.open_short),
+            params_tuple,
+            trades,
+            equity,
+        )
+        trades, equity = trades[:n_trades], equity[:n_equity]
+
+        self.trades_info = ut.build_trades_info(
+            self.data.index,
+            trades,
+            open_reasons=self._open_reasons,
+            close_reasons=("CA {side}", "SL {side}", "Exit {side}"),
+            with_tp_price=False,
+        )
+        self.equity_record = ut.build_equity_record(self.data.index, equity)
+
+        if liquidation_idx >= 0:
+            side = "long" if self.position.side == kernels.LONG else "short"
+            print(f"Your {side} was liquidated on the {self.data.index[liquidation_idx]} (price = {self.position.liquidation_price})")
+            sys.exit()
+
+        self.final_equity = round(equity["equity"][-1], 2)
+
+    # --- Parameter sweep ---
+    @classmethod
+    def run_sweep(cls, params_list, ohlcv, initial_balance, leverage, open_fee_rate, close_fee_rate):
+        """
+        Backtests every parameter set of params_list on the same ohlcv in a single parallel Numba kernel.
+
+        :return: A DataFrame with one row per parameter set: final equity (NaN if liquidated), total trades
+                 and whether the position got liquidated.
+        """
+        averages = {}
+        sweep_params = np.empty(len(params_list), dtype=kernels.SWEEP_PARAMS_DTYPE)
+        envelopes = np.zeros((len(params_list), max(len(params["envelopes"]) for params in params_list)))
+
+        for p, params in enumerate(params_list):
+            mode = params.get("mode", "both")
+            _validate_mode(mode)
+            n_envelopes = _n_envelopes(params)
+            position_size, position_size_is_fraction = _resolve_sizing(params)
+
+            key = (params["average_type"], params["average_period"])
+            if key not in averages:
+                averages[key] = (len(averages), compute_average(ohlcv, *key))
+
+            sweep_params[p] = (
+                averages[key][0],
+                n_envelopes,
+                params["stop_loss_pct"],
+                np.nan if params.get("price_jump_pct") is None else params["price_jump_pct"],
+                position_size,
+                position_size_is_fraction,
+                mode == "short",
+                mode == "long",
             )
-
-        self.trades_info = pd.DataFrame(self.trades_info)
-        self.equity_record = pd.DataFrame(self.equity_record).set_index("time")
-        self.final_equity = round(self.equity_record.iloc[-1]["equity"], 2)
+            envelopes[p, :n_envelopes] = params["envelopes"]
+
+        results = kernels.run_envelope_sweep(
+            kernels.equity_update_indices(ohlcv.index.asi8, pd.Timedelta(hours=6).value),
+            ut.ohlc_tile(ohlcv),
+            np.vstack([average for _, average in averages.values()]),
+            envelopes,
+            sweep_params,
+            (float(initial_balance), float(leverage), float(open_fee_rate), float(close_fee_rate)),
+        )
+
+        return pd.DataFrame({
+            "final_equity": [round(equity, 2) for equity in results["final_equity"]],
+            "total_trades": results["total_trades"],
+            "liquidated": results["liquidation_idx"] >= 0,
+        })
 
     # --- Save results ---
     def save_equity_record(self, path):
@@ -203,3 +181,43 @@ class Strategy:
 
     def save_trades_info(self, path):
         self.trades_info.to_csv(path+'_trades_info.csv', header=True, index=True)
+
+
+def _validate_mode(mode):
+    valid_modes = ("long", "short", "both")
+    if mode not in valid_modes:
+        raise ValueError(f"Wrong strategy mode. Can either be {', '.join(valid_modes)}.")
+
+
+def _n_envelopes(params):
+    n_envelopes = len(params["envelopes"])
+    if n_envelopes > kernels.MAX_ENVELOPES:
+        raise ValueError(f"At most {kernels.MAX_ENVELOPES} envelopes are supported.")
+    return n_envelopes
+
+
+def _resolve_sizing(params):
+    # the position size is split evenly between the bands: (size per band, whether it is a wallet fraction)
+    n_envelopes = _n_envelopes(params)
+    if "position_size_percentage" in params:  # total wallet fraction position size
+        return round(params["position_size_percentage"] / 100 / n_envelopes, 4), True
+    elif "position_size_fixed_amount" in params:  # fixed amount position size
+        return round(params["position_size_fixed_amount"] / n_envelopes, 4), False
+    raise ValueError("Either 'position_size_percentage' or 'position_size_fixed_amount' must be set.")
+
+
+def compute_average(ohlcv, average_type, window):
+    close = ohlcv["close"].to_numpy(dtype=np.float64)
+
+    if "DCM" == average_type:
+        average = ind.donchian_mid_nb(ohlcv["high"].to_numpy(dtype=np.float64), ohlcv["low"].to_numpy(dtype=np.float64), window)
+    elif "SMA" == average_type:
+        average = ind.sma_nb(close, window)
+    elif "EMA" == average_type:
+        average = ind.ema_nb(close, window)
+    elif "WMA" == average_type:
+        average = ind.wma_nb(close, window)
+    else:
+        raise ValueError(f"The average type {average_type} is not supported")
+
+    return ind.lag(average)
@@ -1,15 +1,22 @@
 import sys
-import ta
+import numpy as np
 import pandas as pd
-from datetime import datetime
 
 from . import tools as ut
+from . import _kernels as kernels
+from . import _indicators as ind
+from . import _warmup
 
 
 class Strategy:
-    def __init__(self, params, ohlcv) -> None:
+    def __init__(self, params, ohlcv, warmup=False) -> None:
+        if warmup:  # compile the Numba kernels upfront
+            _warmup.warmup()
+
         self.params = params
-        self.data = ohlcv.copy()
+        # shallow copy: the OHLCV buffers are shared with the caller, who must not modify them in place,
+        # while the indicator and signal columns are only added to self.data
+        self.data = ohlcv.copy(deep=False)
 
         self.populate_indicators()
         self.set_trade_mode()
@@ -32,135 +39,109 @@ class Strategy:
 
     # --- Indicators ---
     def populate_indicators(self):
-        # https://technical-analysis-library-in-python.readthedocs.io/en/latest/ta.html
-        self.data['fastMA'] = ta.trend.sma_indicator(self.data['close'], self.params['fast_ma_period']).shift(1)
-        self.data['slowMA'] = ta.trend.sma_indicator(self.data['close'], self.params['slow_ma_period']).shift(1)
-        self.data['trend'] = ta.trend.sma_indicator(self.data['close'], self.params['trend_ma_period']).shift(1)
+        close = self.data['close'].to_numpy(dtype=np.float64)
+        for name, period in (('fastMA', 'fast_ma_period'), ('slowMA', 'slow_ma_period'), ('trend', 'trend_ma_period')):
+            self.data[name] = ind.lag(ind.sma_nb(close, self.params[period]))
+
+    def _previous_candle(self, condition):
+        # condition evaluated on the previous candle, False on the first one
+        previous = np.zeros(len(condition), dtype=bool)
+        previous[1:] = condition[:-1]
+        return previous
 
     # --- Long Rules ---
+    # take profit and stop loss prices, as factors of the entry (close) price
+    long_tp_factor = 1.3
+    long_sl_factor = 0.85
+
     def populate_long_signals(self):
+        fast_ma = self.data['fastMA'].to_numpy()
+        slow_ma = self.data['slowMA'].to_numpy()
         self.data['open_long'] = (
-                (self.data['fastMA'] > self.data['slowMA']) &
-                (self.data['fastMA'].shift(1) <= self.data['slowMA'].shift(1)) &  # "to check on previous candle"
-                (self.data['close'] > self.data['trend'])
+                (fast_ma > slow_ma) &
+                self._previous_candle(fast_ma <= slow_ma) &  # "to check on previous candle"
+                (self.data['close'].to_numpy() > self.data['trend'].to_numpy())
         )
-        self.data['close_long'] = self.data['fastMA'] < self.data['slowMA']
-
-    def calculate_long_tp_price(self, row):
-        return row['close'] * 1.3
-
-    def calculate_long_sl_price(self, row):
-        return row['close'] * 0.85
+        self.data['close_long'] = fast_ma < slow_ma
 
     # --- Short Rules ---
+    short_tp_factor = 0.7
+    short_sl_factor = 1.15
+
     def populate_short_signals(self):
+        fast_ma = self.data['fastMA'].to_numpy()
+        slow_ma = self.data['slowMA'].to_numpy()
         self.data['open_short'] = (
-                (self.data['fastMA'] < self.data['slowMA']) &
-                (self.data['fastMA'].shift(1) >= self.data['slowMA'].shift(1)) &  # "to check on previous candle"
-                (self.data['close'] < self.data['trend'])
+                (fast_ma < slow_ma) &
+                self._previous_candle(fast_ma >= slow_ma) &  # "to check on previous candle"
+                (self.data['close'].to_numpy() < self.data['trend'].to_numpy())
         )
-        self.data['close_short'] = self.data['fastMA'] > self.data['slowMA']
-
-    def calculate_short_tp_price(self, row):
-        return row['close'] * 0.7
-
-    def calculate_short_sl_price(self, row):
-        return row['close'] * 1.15
+        self.data['close_short'] = fast_ma > slow_ma
 
     # --- Position size ---
-    def calculate_initial_margin(self, balance, price, stop_loss_price):
+    def position_size_settings(self):
         if 'position_size_percentage' in self.params:  # total wallet percentage position size
-            return balance * self.params['position_size_percentage'] / 100
+            return kernels.SIZE_PERCENTAGE, self.params['position_size_percentage']
 
         elif 'position_size_exposure' in self.params:  # risk adjusted (sl) position size
-            amount_at_risk = balance * self.params['exposure'] / 100
-            size = amount_at_risk * price / abs(price - stop_loss_price)
-            return size
+            return kernels.SIZE_EXPOSURE, self.params['position_size_exposure']
 
         elif 'position_size_fixed_amount' in self.params:  # fixed amount position size
-            return self.params['position_size_fixed_amount']
-
-    # --- Positions ---
-    def evaluate_orders(self, time, row):
-        if self.position.side == 'long':
-            if self.position.check_for_sl(row):
-                self.close_trade(time, self.position.sl_price, "SL long")
-
-            elif self.position.check_for_liquidation(row):
-                print(f'Your long was liquidated on the {time} (price = {self.position.liquidation_price})')
-                sys.exit()
-                
-            elif self.position.check_for_tp(row):
-                self.close_trade(time, self.position.tp_price, "TP long")
-
-            elif row["close_long"]:
-                self.close_trade(time,  row['close'], "Exit long")
-
-        elif self.position.side == 'short':
-            if self.position.check_for_sl(row):
-                self.close_trade(time, self.position.sl_price, "SL short")
-                
-            elif self.position.check_for_liquidation(row):
-                print(f'Your short was liquidated on the {time} (price = {self.position.liquidation_price})')
-                sys.exit()
-
-            elif self.position.check_for_tp(row):
-                self.close_trade(time, self.position.tp_price, "TP short")
-
-            elif row["close_short"]:
-                self.close_trade(time, row['close'], "Exit short")
-
-        else:
-            price = row["close"]
-
-            if not self.ignore_longs and row["open_long"]:
-                sl_price = self.calculate_long_sl_price(row)
-                tp_price = self.calculate_long_tp_price(row)
-                initial_margin = self.calculate_initial_margin(self.balance, price, sl_price)
-                self.balance -= initial_margin
-                self.position.open(time, 'long', initial_margin, price, 'Open long', sl_price, tp_price)
-
-            elif not self.ignore_shorts and row["open_short"]:
-                sl_price = self.calculate_short_sl_price(row)
-                tp_price = self.calculate_short_tp_price(row)
-                initial_margin = self.calculate_initial_margin(self.balance, price, sl_price)
-                self.balance -= initial_margin
-                self.position.open(time, 'short', initial_margin, price, 'Open short', sl_price, tp_price)
-
-    def close_trade(self, time, price, reason):
-        self.position.close(time, price, reason)
-        open_balance = self.balance
-        self.balance += self.position.initial_margin + self.position.net_pnl
-        trade_info = self.position.info()
-        trade_info["open_balance"] = open_balance
-        trade_info["close_balance"] = self.balance
-        self.trades_info.append(trade_info)
+            return kernels.SIZE_FIXED, self.params['position_size_fixed_amount']
+
+        raise ValueError("One of 'position_size_percentage', 'position_size_exposure' or "
+                         "'position_size_fixed_amount' must be set.")
 
     # --- Backtest ---
     def run_backtest(self, initial_balance=1000, leverage=1, fee_rate=0.001):
         self.initial_balance = initial_balance
-        self.balance = initial_balance
-        self.position = ut.Position(leverage=leverage, fee_rate=fee_rate)
         self.equity_update_interval = pd.Timedelta(days=1)
-        self.previous_equity_update_time = datetime(1900, 1, 1)
-        self.trades_info = []
-        self.equity_record = []
-
-        for time, row in self.data.iterrows():
-            self.evaluate_orders(time, row)
-            self.previous_equity_update_time = ut.update_equity_record(
-                time,
-                self.position,
-                self.balance,
-                row["close"],
-                self.previous_equity_update_time,
-                self.equity_update_interval,
-                self.equity_record
-            )
-
-        self.trades_info = pd.DataFrame(self.trades_info)
-        self.equity_record = pd.DataFrame(self.equity_record).set_index("time")
-        self.final_equity = round(self.equity_record.iloc[-1]["equity"], 2)
+
+        position_size_mode, position_size = self.position_size_settings()
+        params_tuple = (
+            float(initial_balance),
+            float(leverage),
+            float(fee_rate),
+            float(fee_rate),
+            position_size_mode,
+            float(position_size),
+            self.ignore_longs,
+            self.ignore_shorts,
+            float(self.long_sl_factor),
+            float(self.long_tp_factor),
+            float(self.short_sl_factor),
+            float(self.short_tp_factor),
+        )
+
+        equity_idx = kernels.equity_update_indices(self.data.index.asi8, self.equity_update_interval.value)
+        trades, equity = ut.allocate_records(len(self.data), len(equity_idx))
+        n_trades, n_equity, self.balance, self.position, liquidation_idx = kernels.run_sma_kernel(
+            equity_idx,
+            ut.ohlc_tile(self.data),
+            ut.column_array(self.data, 'close_long', bool),
+            ut.column_array(self.data, 'close_short', bool),
+            ut.column_array(self.data, 'open_long', bool),
+            ut.column_array(self.data, 'open_short', bool),
+            params_tuple,
+            trades,
+            equity,
+        )
+        trades, equity = trades[:n_trades], equity[:n_equity]
+
+        self.trades_info = ut.build_trades_info(
+            self.data.index,
+            trades,
+            open_reasons=("Open {side}",),
+            close_reasons=("SL {side}", "TP {side}", "Exit {side}"),
+        )
+        self.equity_record = ut.build_equity_record(self.data.index, equity)
+
+        if liquidation_idx >= 0:
+            side = 'long' if self.position.side == kernels.LONG else 'short'
+            print(f'Your {side} was liquidated on the {self.data.index[liquidation_idx]} (price = {self.position.liquidation_price})')
+            sys.exit()
+
+        self.final_equity = round(equity["equity"][-1], 2)
 
     # --- Save results ---
     def save_equity_record(self, path):
@@ -1,65 +1,21 @@
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
-from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional, Sequence
 
-
-class PositionBehavior(ABC):
-    @abstractmethod
-    def calculate_pnl(self, position, close_price, amount):
-        pass
-
-    @abstractmethod
-    def calculate_liquidation_price(self, position, price):
-        pass
-
-    @abstractmethod
-    def check_for_sl(self, position, row):
-        pass
-
-    @abstractmethod
-    def check_for_tp(self, position, row):
-        pass
-
-    @abstractmethod
-    def check_for_liquidation(self, position, row):
-        pass
-
-
-class LongPositionBehavior(PositionBehavior):
-    def calculate_pnl(self, position, close_price, amount):
-        return amount * (close_price - position.open_price)
-
-    def calculate_liquidation_price(self, position, price):  ### approximated computation, check exchange specifics.
-        return price * (1 - 1 / position.leverage)
-
-    def check_for_sl(self, position, row):
-        return row['low'] <= position.sl_price
-
-    def check_for_tp(self, position, row):
-        return row['high'] >= position.tp_price
-
-    def check_for_liquidation(self, position, row):
-        return row['low'] <= position.liquidation_price
-
-
-class ShortPositionBehavior(PositionBehavior):
-    def calculate_pnl(self, position, close_price, amount):
-        return amount * (position.open_price - close_price)
-
-    def calculate_liquidation_price(self, position, price):  ### approximated computation, check exchange specifics.
-        return price * (1 + 1 / position.leverage)
-
-    def check_for_sl(self, position, row):
-        return row['high'] >= position.sl_price
-
-    def check_for_tp(self, position, row):
-        return row['low'] <= position.tp_price
-
-    def check_for_liquidation(self, position, row):
-        return row['high'] >= position.liquidation_price
+from ._kernels import TRADE_DTYPE, EQUITY_DTYPE, LONG
 
 
+# Standalone, object based model of a position. The backtests do not use it: the Numba kernels mirror its
+# opening/closing/liquidation arithmetic on _kernels.PositionState instead.
 class Position:
+    __slots__ = (
+        "leverage", "open_fee_rate", "close_fee_rate", "side", "open_time", "close_time", "open_price",
+        "close_price", "open_reason", "close_reason", "open_fee", "close_fee", "initial_margin",
+        "open_notional_value", "close_notional_value", "amount", "net_pnl", "net_pnl_pct", "sl_price", "tp_price",
+        "liquidation_price", "is_long",
+    )
+
     def __init__(
             self,
             leverage: Optional[int] = 1,
@@ -88,7 +44,7 @@ class Position:
         self.sl_price = None
         self.tp_price = None
         self.liquidation_price = None
-        self.behavior = None
+        self.is_long = None
 
     def _calculate_opening_metrics(self, initial_margin: float, open_price: float):
         open_notional_value = initial_margin * self.leverage
@@ -119,7 +75,7 @@ class Position:
         self.open_reason = open_reason
         self.sl_price = sl_price
         self.tp_price = tp_price
-        self.behavior = LongPositionBehavior() if side == "long" else ShortPositionBehavior()
+        self.is_long = side == "long"
         metrics = self._calculate_opening_metrics(self.initial_margin, self.open_price)
         self.open_fee = metrics['open_fee']
         self.open_notional_value = metrics['open_notional_value']
@@ -174,43 +130,77 @@ class Position:
         }
 
     def calculate_pnl(self, price: float, amount: float) -> float:
-        return self.behavior.calculate_pnl(self, price, amount)
-
-    def calculate_liquidation_price(self, price: float) -> float:
-        return self.behavior.calculate_liquidation_price(self, price)
-
-    def check_for_liquidation(self, row: Dict[str, float]) -> bool:
-        return self.behavior.check_for_liquidation(self, row)
-
-    def check_for_sl(self, row: Dict[str, float]) -> bool:
-        return self.behavior.check_for_sl(self, row)
-
-    def check_for_tp(self, row: Dict[str, float]) -> bool:
-        return self.behavior.check_for_tp(self, row)
-
-
-def update_equity_record(
-    time: datetime,
-    position: Optional[Position],
-    balance: float,
-    price: float,
-    previous_equity_update_time: datetime,
-    equity_update_interval: timedelta,
-    equity_record: List[Dict[str, Any]]
-) -> datetime:
-
-    if time - previous_equity_update_time >= equity_update_interval:
-        equity = balance
-        if position.side:
-            unrealized_pnl = position.calculate_pnl(price, position.amount)
-            close_fee = (position.open_notional_value + unrealized_pnl) * position.close_fee_rate
-            equity += position.initial_margin + unrealized_pnl - position.open_fee - close_fee
-
-        equity_record.append({
-            "time": time,
-            "price": price,
-            "equity": equity
-        })
-
-        return time
-    return previous_equity_update_time
+        if self.is_long:
+            return amount * (price - self.open_price)
+        return amount * (self.open_price - price)
+
+    def calculate_liquidation_price(self, price: float) -> float:  ### approximated computation, check exchange specifics.
+        if self.is_long:
+            return price * (1 - 1 / self.leverage)
+        return price * (1 + 1 / self.leverage)
+
+    def check_for_liquidation(self, low: float, high: float) -> bool:
+        return low <= self.liquidation_price if self.is_long else high >= self.liquidation_price
+
+    def check_for_sl(self, low: float, high: float) -> bool:
+        return low <= self.sl_price if self.is_long else high >= self.sl_price
+
+    def check_for_tp(self, low: float, high: float) -> bool:
+        return high >= self.tp_price if self.is_long else low <= self.tp_price
+
+
+def column_array(data: pd.DataFrame, name: str, dtype=np.float64) -> np.ndarray:
+    # signals of an ignored side are not populated, they are seen as never triggering
+    if name not in data:
+        return np.zeros(len(data), dtype=dtype)
+    return data[name].to_numpy(dtype=dtype, copy=False)
+
+
+def ohlc_tile(data: pd.DataFrame) -> np.ndarray:
+    # row-major (n_bars, 4) open/high/low/close prices, the layout the kernels scan bar by bar
+    return np.ascontiguousarray(data[["open", "high", "low", "close"]].to_numpy(dtype=np.float64))
+
+
+def band_mask(signals: np.ndarray) -> np.ndarray:
+    # (n_bars, n_envelopes) boolean matrix -> one uint64 per bar, bit j set when envelope j is triggered
+    bits = np.uint64(1) << np.arange(signals.shape[1], dtype=np.uint64)
+    return np.bitwise_or.reduce(signals * bits, axis=1)
+
+
+def allocate_records(n_bars: int, n_equity_updates: int):
+    # a bar closes at most one trade
+    return np.empty(n_bars, dtype=TRADE_DTYPE), np.empty(n_equity_updates, dtype=EQUITY_DTYPE)
+
+
+def build_trades_info(
+    index: pd.Index,
+    trades: np.ndarray,
+    open_reasons: Sequence[str],
+    close_reasons: Sequence[str],
+    with_tp_price: bool = True,
+) -> pd.DataFrame:
+
+    # reason templates are formatted once per side, trades then pick their label by (side, code)
+    side_idx = (trades["side"] != LONG).astype(np.intp)
+    open_labels = np.array([[reason.format(side=side) for reason in open_reasons] for side in ("long", "short")], dtype=object)
+    close_labels = np.array([[reason.format(side=side) for reason in close_reasons] for side in ("long", "short")], dtype=object)
+
+    trades_info = {
+        "open_time": index[trades["open_idx"]],
+        "close_time": index[trades["close_idx"]],
+        "open_reason": open_labels[side_idx, trades["open_reason"]],
+        "close_reason": close_labels[side_idx, trades["close_reason"]],
+    }
+    for name in TRADE_DTYPE.names[5:]:
+        if name == "tp_price" and not with_tp_price:
+            continue
+        trades_info[name] = trades[name]
+
+    return pd.DataFrame(trades_info)
+
+
+def build_equity_record(index: pd.Index, equity: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"price": equity["price"], "equity": equity["equity"]},
+        index=index[equity["idx"]].rename("time"),
+    )
@@ -1,16 +1,34 @@
+import numpy as np
 import pandas as pd
 import io
 import datetime
-import matplotlib.pyplot as plt
-from lightweight_charts import JupyterChart
-from typing import Optional
+import hashlib
+import os
+import pickle
+import tempfile
+from numba import njit
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+# the plotting libraries are imported by the plot functions only, so computing metrics does not pay their import time
+if TYPE_CHECKING:
+    from lightweight_charts import JupyterChart
+
+# above this many points, equity/drawdown curves are drawn from every k-th record
+MAX_PLOT_POINTS = 50_000
+
+# metrics cached by BacktestAnalysis(..., cache_metrics=True), bump the version whenever compute_metrics changes
+METRICS_CACHE_DIR = Path.home().joinpath(".cache", "backtest_metrics")
+METRICS_CACHE_VERSION = 1
+
 
 class BacktestAnalysis:
 
-    def __init__(self, strategy) -> None:
-        self.data = strategy.data.copy()
-        self.trades = strategy.trades_info.copy()
-        self.wallet = strategy.equity_record.copy()
+    def __init__(self, strategy, cache_metrics: bool = False) -> None:
+        # the analysis only adds columns (duration, drawdown_pct), shallow copies keep the strategy frames untouched
+        self.data = strategy.data
+        self.trades = strategy.trades_info.copy(deep=False)
+        self.wallet = strategy.equity_record.copy(deep=False)
 
         if self.trades.empty:
             raise ValueError('trades_info is empty, probably need to run the backtest first')
@@ -18,17 +36,81 @@ class BacktestAnalysis:
         if self.wallet.empty:
             raise ValueError('equity_record is empty, probably need to run the backtest first')
 
+        if cache_metrics:
+            self.load_or_compute_metrics()
+        else:
+            self.compute_metrics()
+
+    def load_or_compute_metrics(self) -> None:
+        """
+        Loads the metrics of these trades and equity record from METRICS_CACHE_DIR, or computes and caches them.
+        The cache key hashes METRICS_CACHE_VERSION and the columns the metrics are computed from.
+        """
+        key = hashlib.sha256(str(METRICS_CACHE_VERSION).encode())
+        arrays = [self.trades[name].to_numpy() for name in
+                  ('net_pnl', 'net_pnl_pct', 'open_fee', 'close_fee', 'open_time', 'close_time', 'close_balance')]
+        arrays += [self.wallet['equity'].to_numpy(), self.wallet['price'].to_numpy(), self.wallet.index.to_numpy()]
+        for array in arrays:
+            key.update(array.tobytes())
+        for name in ('open_reason', 'close_reason'):  # object columns, hashed as integer codes plus their labels
+            codes, labels = pd.factorize(self.trades[name])
+            key.update(codes.tobytes())
+            key.update(repr(labels.tolist()).encode())
+        cache_path = METRICS_CACHE_DIR.joinpath(f"{key.hexdigest()}.pkl")
+
+        cached = _load_cached_metrics(cache_path)
+        if cached is not None:
+            metrics, trades_columns, wallet_columns = cached
+            for name, column in trades_columns.items():
+                self.trades[name] = column
+            for name, column in wallet_columns.items():
+                self.wallet[name] = column
+            vars(self).update(metrics)
+            # the rows of self.trades kept as metrics are selected again rather than stored
+            net_pnl = self.trades['net_pnl'].to_numpy(np.float64)
+            self.good_trades = self.trades.loc[net_pnl > 0]
+            self.bad_trades = self.trades.loc[net_pnl < 0]
+            self.best_trade = self.trades.iloc[np.argmax(net_pnl)]
+            self.worst_trade = self.trades.iloc[np.argmin(self.trades['net_pnl_pct'].to_numpy(np.float64))]
+            return
+
+        attributes, trades_names, wallet_names = set(vars(self)), set(self.trades), set(self.wallet)
         self.compute_metrics()
 
+        attributes |= {'good_trades', 'bad_trades', 'best_trade', 'worst_trade'}
+        METRICS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # written to a temporary file then moved into place, so an interrupted or concurrent write
+        # never leaves a truncated entry behind
+        with tempfile.NamedTemporaryFile('wb', dir=METRICS_CACHE_DIR, suffix='.tmp', delete=False) as file:
+            try:
+                pickle.dump((
+                    {name: value for name, value in vars(self).items() if name not in attributes},
+                    {name: self.trades[name].to_numpy() for name in self.trades if name not in trades_names},
+                    {name: self.wallet[name].to_numpy() for name in self.wallet if name not in wallet_names},
+                ), file)
+            except BaseException:
+                file.close()
+                os.remove(file.name)
+                raise
+        os.replace(file.name, cache_path)
+
     def compute_metrics(self) -> None:
 
         # --- Trades Info ---
-        self.trades['duration'] = self.trades['close_time'] - self.trades["open_time"]
-
-        self.mean_trade_duration = self.trades['duration'].mean()
+        # columns extracted once, the reductions below run on the raw arrays
+        durations = (self.trades['close_time'].to_numpy('datetime64[ns]').view(np.int64)
+                     - self.trades['open_time'].to_numpy('datetime64[ns]').view(np.int64))
+        self.trades['duration'] = durations.view('timedelta64[ns]')
+        net_pnl = self.trades['net_pnl'].to_numpy(np.float64)
+        net_pnl_pct = self.trades['net_pnl_pct'].to_numpy(np.float64)
+        fees = self.trades['open_fee'].to_numpy(np.float64) + self.trades['close_fee'].to_numpy(np.float64)
+        good_mask = net_pnl > 0
+        bad_mask = net_pnl < 0
+
+        self.mean_trade_duration = _mean_duration(durations)
         self.total_trades = len(self.trades)
 
-        self.good_trades = self.trades.loc[self.trades["net_pnl"] > 0]
+        self.good_trades = self.trades.loc[good_mask]
         if self.good_trades.empty:
             print("/!\\ No winning trades were found !")
             self.total_good_trades = 0
@@ -36,10 +118,10 @@ class BacktestAnalysis:
             self.mean_good_trades_duration = 0
         else:
             self.total_good_trades = len(self.good_trades)
-            self.avg_pnl_pct_good_trades = self.good_trades["net_pnl_pct"].mean()
-            self.mean_good_trades_duration = self.good_trades["duration"].mean()
+            self.avg_pnl_pct_good_trades = net_pnl_pct[good_mask].mean()
+            self.mean_good_trades_duration = _mean_duration(durations[good_mask])
 
-        self.bad_trades = self.trades.loc[self.trades["net_pnl"] < 0]
+        self.bad_trades = self.trades.loc[bad_mask]
         if self.bad_trades.empty:
             print("/!\\ No losing trades were found !")
             self.total_bad_trades = 0
@@ -47,58 +129,54 @@ class BacktestAnalysis:
             self.mean_bad_trades_duration = 0
         else:
             self.total_bad_trades = len(self.bad_trades)
-            self.avg_pnl_pct_bad_trades = self.bad_trades["net_pnl_pct"].mean()
-            self.mean_bad_trades_duration = self.bad_trades["duration"].mean()
+            self.avg_pnl_pct_bad_trades = net_pnl_pct[bad_mask].mean()
+            self.mean_bad_trades_duration = _mean_duration(durations[bad_mask])
 
-        self.best_trade = self.trades.loc[self.trades["net_pnl"].idxmax()]
-        self.worst_trade = self.trades.loc[self.trades["net_pnl_pct"].idxmin()]
+        self.best_trade = self.trades.iloc[np.argmax(net_pnl)]
+        self.worst_trade = self.trades.iloc[np.argmin(net_pnl_pct)]
         self.global_win_rate = self.total_good_trades / self.total_trades
-        self.avg_pnl_pct = self.trades["net_pnl_pct"].mean()
-        self.profit_factor = abs(self.trades.loc[self.trades['net_pnl'] > 0, 'net_pnl'].sum() / self.trades.loc[self.trades['net_pnl'] < 0, 'net_pnl'].sum())
+        self.avg_pnl_pct = net_pnl_pct.mean()
+        self.profit_factor = abs(net_pnl[good_mask].sum() / net_pnl[bad_mask].sum())
 
-        self.trades['balance_ath'] = self.trades['close_balance'].cummax()
-        self.trades['drawdown'] = self.trades['balance_ath'] - self.trades['close_balance']
-        self.trades['drawdown_pct'] = self.trades['drawdown'] / self.trades['balance_ath']
-        self.max_drawdown_trades = self.trades["drawdown_pct"].max()
+        self.max_drawdown_trades = np.nanmax(_drawdown_pct(self.trades['close_balance'].to_numpy(np.float64)))
+
+        # reason counts are formatted once, print_metrics only outputs them
+        self.open_reasons_count = self.trades["open_reason"].value_counts().to_string(header=False)
+        self.close_reasons_count = self.trades["close_reason"].value_counts().to_string(header=False)
 
-        fees = self.trades['open_fee'] + self.trades['close_fee']
         self.total_fee = round(fees.sum(), 2)
         self.biggest_fee = round(fees.max(), 2)
         self.avg_fee = round(fees.mean(), 2)
 
-        try:
-            self.trades['win'] = self.trades['net_pnl'] > 0
-            streak_changes = self.trades['win'].ne(self.trades['win'].shift()).cumsum()
-            streaks = self.trades.groupby(streak_changes).agg({'win': ['sum', 'count']})
-            streaks.columns = streaks.columns.map('_'.join)
-            self.max_win_streak = streaks.loc[streaks['win_sum'] == streaks['win_count'], 'win_count'].max()
-            self.max_lose_streak = streaks.loc[streaks['win_sum'] == 0, 'win_count'].max()
-        except Exception as e:
-            pass
+        max_win_streak, max_lose_streak = _max_streaks(net_pnl)
+        self.max_win_streak = max_win_streak if max_win_streak > 0 else np.nan
+        self.max_lose_streak = max_lose_streak if max_lose_streak > 0 else np.nan
 
         # --- Equity Record ---
-        returns = self.wallet["equity"].pct_change()
-        equity_ath = self.wallet["equity"].cummax()
-        self.wallet["drawdown"] = equity_ath - self.wallet["equity"]
-        self.wallet["drawdown_pct"] = self.wallet["drawdown"] / equity_ath
+        equity = self.wallet["equity"].to_numpy(np.float64)
+        returns = np.full(len(equity), np.nan)  # laid out like pct_change, so the nan-reductions match pandas
+        returns[1:] = equity[1:] / equity[:-1] - 1
+        mean_return = np.nanmean(returns)
+        self.wallet["drawdown_pct"] = _drawdown_pct(equity)
 
         self.max_drawdown_equity = self.wallet["drawdown_pct"].max()
-        self.initial_balance = self.wallet.iloc[0]["equity"]
-        self.final_balance = self.wallet.iloc[-1]["equity"]
+        self.initial_balance = equity[0]
+        self.final_balance = equity[-1]
         self.roi = self.final_balance / self.initial_balance - 1
 
-        self.sharpe_ratio = 365 ** 0.5 * returns.mean() / returns.std()
-        self.sortino_ratio = 365 ** 0.5 * returns.mean() / returns[returns < 0].std()
-        self.calmar_ratio = returns.mean() * 365 / self.max_drawdown_equity
+        self.sharpe_ratio = 365 ** 0.5 * mean_return / np.nanstd(returns, ddof=1)
+        self.sortino_ratio = 365 ** 0.5 * mean_return / returns[returns < 0].std(ddof=1)
+        self.calmar_ratio = mean_return * 365 / self.max_drawdown_equity
 
-        self.hodl_pct = self.wallet.iloc[-1]['price'] / self.wallet.iloc[0]['price'] - 1
+        price = self.wallet["price"].to_numpy(np.float64)
+        self.hodl_pct = price[-1] / price[0] - 1
         hodl = self.initial_balance * (1 + self.hodl_pct)
         self.performance_vs_hodl = (self.final_balance - hodl) / hodl
 
         total_days = (self.wallet.index[-1] - self.wallet.index[0]).days + 1
         self.mean_trades_per_day = self.total_trades / total_days
 
-        total_time_in_position = self.trades['duration'].sum()
+        total_time_in_position = pd.Timedelta(durations.sum(), unit='ns')
         total_backtest_period = self.wallet.index.max() - self.wallet.index.min()
         self.time_in_position_ratio = (total_time_in_position.total_seconds() / total_backtest_period.total_seconds())
         self.return_over_max_drawdown = self.roi / abs(self.max_drawdown_equity)
@@ -111,9 +189,9 @@ class BacktestAnalysis:
 
     def plot_monthly_performance(self, path: Optional[str] = None, year: str = "all") -> None:
         if year == "all":
-            years = self.wallet.index.year.unique()
-            for yr in years:
-                plot_monthly_performance(self.wallet, year=yr, path=path)
+            performances = compute_monthly_performances(self.wallet)  # every year from a single groupby
+            for yr in performances:
+                plot_monthly_performance(self.wallet, year=yr, path=path, performances=performances)
         else:
             plot_monthly_performance(self.wallet, year=year, path=path)
 
@@ -161,9 +239,9 @@ class BacktestAnalysis:
         print(f"Max win streak: {self.max_win_streak}", file=result_io)
         print(f"Max lose streak: {self.max_lose_streak}", file=result_io)
         print("Open reasons:", file=result_io)
-        print(self.trades["open_reason"].value_counts().to_string(header=False), file=result_io)
+        print(self.open_reasons_count, file=result_io)
         print("Close reasons:", file=result_io)
-        print(self.trades["close_reason"].value_counts().to_string(header=False), file=result_io)
+        print(self.close_reasons_count, file=result_io)
 
         print("\n--- Fees in Quote ---", file=result_io)
         print(f"Total: {self.total_fee}", file=result_io)
@@ -181,7 +259,52 @@ class BacktestAnalysis:
 
 
 # --- Utilities ---
+def _downsample(data: pd.DataFrame) -> pd.DataFrame:
+    if len(data) <= MAX_PLOT_POINTS:
+        return data
+    return data.iloc[::-(-len(data) // MAX_PLOT_POINTS)]
+
+
+def _load_cached_metrics(cache_path: Path) -> Optional[Tuple[dict, dict, dict]]:
+    # a missing or unreadable entry is a cache miss, it is then recomputed and overwritten
+    try:
+        with open(cache_path, 'rb') as file:
+            metrics, trades_columns, wallet_columns = pickle.load(file)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+    return metrics, trades_columns, wallet_columns
+
+
+def _drawdown_pct(values: np.ndarray) -> np.ndarray:
+    # drawdown from the running all time high, as a fraction of it
+    ath = np.maximum.accumulate(values)
+    return (ath - values) / ath
+
+
+def _mean_duration(durations: np.ndarray) -> pd.Timedelta:
+    # mean of int64 nanoseconds, truncated like pandas' timedelta mean
+    return pd.Timedelta(np.int64(durations.mean()), unit='ns')
+
+
+@njit(cache=True)
+def _max_streaks(pnl):
+    # longest runs of winning (pnl > 0) and non winning trades, in a single pass
+    max_win = max_lose = cur_win = cur_lose = 0
+    for value in pnl:
+        if value > 0:
+            cur_win += 1
+            cur_lose = 0
+            max_win = max(max_win, cur_win)
+        else:
+            cur_lose += 1
+            cur_win = 0
+            max_lose = max(max_lose, cur_lose)
+    return max_win, max_lose
+
+
 def plot_equity(equity_record: pd.DataFrame, plot_price: bool = True, path: Optional[str] = None) -> None:
+    import matplotlib.pyplot as plt
+
     config = {
         'fig_size': (8, 4),
         'color': {
@@ -199,14 +322,15 @@ def plot_equity(equity_record: pd.DataFrame, plot_price: bool = True, path: Opti
     }
 
     data = equity_record
+    plotted = _downsample(data)
     fig, ax_price = plt.subplots(figsize=config['fig_size'])
     ax_equity = ax_price.twinx()
 
     plt.title("Equity Value" + (" vs Asset Price" if plot_price else ""), fontsize=config['font_size']['title'])
 
     if plot_price:
-        ax_price.plot(data.index, data['price'], color=config['color']['price'], lw=config['line_width'],
-                      label="Asset Price")
+        ax_price.plot(plotted.index, plotted['price'], color=config['color']['price'], lw=config['line_width'],
+                      label="Asset Price", rasterized=True)
         ax_price.set_ylabel("Asset Price in Quote", color=config['color']['price'],
                             fontsize=config['font_size']['axis_label'])
         ax_price.tick_params(axis='y', colors=config['color']['price'], labelsize=config['font_size']['tick_params'])
@@ -220,10 +344,11 @@ def plot_equity(equity_record: pd.DataFrame, plot_price: bool = True, path: Opti
         ax_equity.tick_params(axis='y', labelsize=config['font_size']['tick_params'])
         ax_equity.set_ylabel("Equity Value in Quote", fontsize=config['font_size']['axis_label'])
 
-    ax_equity.plot(data.index, data['equity'], color=config['color']['equity'], lw=config['line_width'],
-                   label="Equity Value")
-    ax_equity.fill_between(data.index, data['equity'], alpha=config['alpha'], color=config['color']['equity'])
-    ax_equity.axhline(y=data.iloc[0]['equity'], color='black', lw=config['line_width'], ls='--')
+    ax_equity.plot(plotted.index, plotted['equity'], color=config['color']['equity'], lw=config['line_width'],
+                   label="Equity Value", rasterized=True)
+    ax_equity.fill_between(plotted.index, plotted['equity'], alpha=config['alpha'], color=config['color']['equity'],
+                           rasterized=True)
+    ax_equity.axhline(y=data['equity'].to_numpy()[0], color='black', lw=config['line_width'], ls='--')
     equity_range = data['equity'].max() - data['equity'].min()
     ax_equity.set_ylim(data['equity'].min() - equity_range * 0.1, data['equity'].max() + equity_range * 0.1)
     ax_equity.set_xlim(data.index.min(), data.index.max())
@@ -244,6 +369,8 @@ def plot_equity(equity_record: pd.DataFrame, plot_price: bool = True, path: Opti
 
 
 def plot_drawdown(equity_record: pd.DataFrame, path: Optional[str] = None) -> None:
+    import matplotlib.pyplot as plt
+
     config = {
         'fig_size': (8, 4),
         'color': {
@@ -262,10 +389,12 @@ def plot_drawdown(equity_record: pd.DataFrame, path: Optional[str] = None) -> No
 
     fig, ax = plt.subplots(figsize=config['fig_size'])
     data = equity_record
+    plotted = _downsample(data)
 
     ax.title.set_text("Drawdown")
-    ax.plot(-data['drawdown_pct'] * 100, color=config['color']['drawdown'], lw=config['line_width'])
-    ax.fill_between(data.index, -data['drawdown_pct'] * 100, alpha=config['alpha'], color=config['color']['drawdown'])
+    ax.plot(-plotted['drawdown_pct'] * 100, color=config['color']['drawdown'], lw=config['line_width'], rasterized=True)
+    ax.fill_between(plotted.index, -plotted['drawdown_pct'] * 100, alpha=config['alpha'], color=config['color']['drawdown'],
+                    rasterized=True)
     ax.axhline(y=0, color=config['color']['line'], alpha=0.3, lw=config['line_width'])
     ax.set_ylabel("%", color=config['color']['line'], fontsize=config['font_size']['axis_label'])
     ax.tick_params(axis='y', labelsize=config['font_size']['tick_params'])
@@ -279,7 +408,26 @@ def plot_drawdown(equity_record: pd.DataFrame, path: Optional[str] = None) -> No
         plt.show()
 
 
-def plot_monthly_performance(equity_record: pd.DataFrame, year: int, path: Optional[str] = None) -> None:
+def compute_monthly_performances(equity_record: pd.DataFrame) -> Dict[int, Tuple[float, List[float]]]:
+    # first/last equity of every (year, month) in one groupby -> {year: (yearly %, [monthly % for January..December])}
+    index = equity_record.index
+    bounds = equity_record['equity'].groupby([index.year, index.month]).agg(['first', 'last'])
+
+    performances = {}
+    for year, yearly_bounds in bounds.groupby(level=0):
+        first, last = yearly_bounds['first'].to_numpy()[0], yearly_bounds['last'].to_numpy()[-1]
+        monthly_bounds = yearly_bounds.droplevel(0).reindex(range(1, 13))  # months without data count as 0
+        performances[int(year)] = (
+            ((last - first) / first) * 100,
+            (((monthly_bounds['last'] - monthly_bounds['first']) / monthly_bounds['first']) * 100).fillna(0).tolist(),
+        )
+    return performances
+
+
+def plot_monthly_performance(equity_record: pd.DataFrame, year: int, path: Optional[str] = None,
+                             performances: Optional[Dict[int, Tuple[float, List[float]]]] = None) -> None:
+    import matplotlib.pyplot as plt
+
     config = {
         'fig_size': (8, 4),
         'colors': {
@@ -297,28 +445,14 @@ def plot_monthly_performance(equity_record: pd.DataFrame, year: int, path: Optio
     }
 
     year = int(year)
-    yearly_data = equity_record[equity_record.index.year == year]
+    if performances is None:
+        performances = compute_monthly_performances(equity_record[equity_record.index.year == year])
 
-    if yearly_data.empty:
+    if year not in performances:
         print(f"No data available for the year {year}.")
         return
 
-    yearly_performance = 0
-    if not yearly_data.empty:
-        yearly_performance = ((yearly_data['equity'].iloc[-1] - yearly_data['equity'].iloc[0]) /
-                              yearly_data['equity'].iloc[0]) * 100
-
-    monthly_performances = []
-    for month in range(1, 13):
-        monthly_data = yearly_data[yearly_data.index.month == month]
-
-        if not monthly_data.empty:
-            monthly_performance = ((monthly_data['equity'].iloc[-1] - monthly_data['equity'].iloc[0]) /
-                                   monthly_data['equity'].iloc[0]) * 100
-        else:
-            monthly_performance = 0
-
-        monthly_performances.append(monthly_performance)
+    yearly_performance, monthly_performances = performances[year]
 
     months = [datetime.date(1900, month, 1).strftime('%B') for month in range(1, 13)]
 
@@ -358,10 +492,11 @@ def plot_monthly_performance(equity_record: pd.DataFrame, year: int, path: Optio
 
 
 def plot_candlestick(trades: pd.DataFrame, ohlcv: pd.DataFrame, indicators: Optional[dict] = None, show_volume: bool = False) -> None:
+    from lightweight_charts import JupyterChart
+
     chart = JupyterChart(width=900, height=400)
     if not show_volume:
-        ohlcv = ohlcv.copy()
-        del ohlcv['volume']
+        ohlcv = ohlcv.drop(columns='volume')
 
     chart.set(ohlcv)
 
@@ -370,8 +505,34 @@ def plot_candlestick(trades: pd.DataFrame, ohlcv: pd.DataFrame, indicators: Opti
             line = chart.create_line(name, ind['color'], price_line=False)
             line.set(ind['df'])
 
-    for index, row in trades.iterrows():
-        chart.marker(time=row['open_time'], position="below", shape="arrow_up", color="white", text=row['open_reason'])
-        chart.marker(time=row['close_time'], position="above", shape="arrow_down", color="white", text=row['close_reason'])
+    markers = []
+    for open_time, close_time, open_reason, close_reason in zip(
+            trades['open_time'], trades['close_time'], trades['open_reason'], trades['close_reason']):
+        markers.append((open_time, "below", "arrow_up", open_reason))
+        markers.append((close_time, "above", "arrow_down", close_reason))
+    _set_markers(chart, markers, color="white")
 
     chart.load()
+
+
+def _set_markers(chart: "JupyterChart", markers: List[Tuple], color: str) -> None:
+    # chart.marker() redraws every marker already placed, so all the (time, position, shape, text) markers
+    # are appended in a single script and drawn once (as an array literal: calls are limited to 65535 arguments).
+    # This reimplements AbstractChart.marker() of the pinned lightweight_charts 1.0.18.8, down to its private
+    # time formatting and the JS side markers array: if those helpers are gone, markers are placed one by one.
+    try:
+        from lightweight_charts.util import marker_position, marker_shape
+        format_time = chart._single_datetime_format
+    except (ImportError, AttributeError):
+        for time, position, shape, text in markers:
+            chart.marker(time=time, position=position, shape=shape, color=color, text=text)
+        return
+
+    js_markers = []
+    for time, position, shape, text in markers:
+        time = format_time(time)
+        time = time if isinstance(time, float) else f"'{time}'"
+        js_markers.append(f"{{time: {time}, position: '{marker_position(position)}', color: '{color}', "
+                          f"shape: '{marker_shape(shape)}', text: '{text}'}}")
+    chart.run_script(f"{chart.id}.markers = {chart.id}.markers.concat([{', '.join(js_markers)}]); "
+                     f"{chart.id}.series.setMarkers({chart.id}.markers)")
@@ -1,8 +1,13 @@
+import asyncio
 import ccxt
+import ccxt.async_support
+import numpy as np
 import pandas as pd
+import re
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Coroutine
 
 
 # Dictionary of supported exchanges
@@ -21,6 +26,9 @@ EXCHANGES: Dict[str, Dict[str, Any]] = {
     },
 }
 
+# Number of OHLCV requests sent concurrently (the exchange rate limit is still enforced by ccxt)
+CONCURRENT_REQUESTS = 10
+
 # Dictionary  supported timeframes
 TIMEFRAMES: Dict[str, Dict[str, Any]] = {
     "1m": {"timedelta": timedelta(minutes=1), "interval_ms": 60000},
@@ -37,6 +45,12 @@ TIMEFRAMES: Dict[str, Dict[str, Any]] = {
     "1M": {"timedelta": timedelta(days=30), "interval_ms": 2629746000}
 }
 
+# Zero padded forms of the supported date formats, parsed without going through strptime
+_DATE_PATTERNS: Dict[str, re.Pattern] = {
+    "%Y-%m-%d": re.compile(r"(\d{4})-(\d{2})-(\d{2})", re.ASCII),
+    "%Y-%m-%d %H:%M:%S": re.compile(r"(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})", re.ASCII),
+}
+
 
 class DataManager:
     """
@@ -73,7 +87,7 @@ class DataManager:
     def download(self, symbol: str, timeframe: str, start_date: Optional[str] = None,
                  end_date: Optional[str] = None) -> None:
         """
-        Downloads OHLCV data for a given symbol and timeframe, saving it to a CSV file.
+        Downloads OHLCV data for a given symbol and timeframe, saving it to a Parquet file.
 
         :param symbol: Trading pair symbol (e.g., 'BTC/USDT').
         :param timeframe: Timeframe for the OHLCV data.
@@ -98,7 +112,7 @@ class DataManager:
             start_date = datetime(2017, 1, 1, 0, 0, 0)
         else:
             try:
-                start_date = datetime.strptime(start_date, date_format)
+                start_date = _parse_date(start_date, date_format)
             except ValueError:
                 raise ValueError(date_format_error_message)
 
@@ -106,24 +120,24 @@ class DataManager:
             end_date = datetime.now()
         else:
             try:
-                end_date = datetime.strptime(end_date, date_format)
+                end_date = _parse_date(end_date, date_format)
             except ValueError:
                 raise ValueError(date_format_error_message)
 
-        ohlcv = self._get_ohlcv(symbol, timeframe, start_date, end_date)
-        ohlcv = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        ohlcv['date'] = pd.to_datetime(ohlcv['timestamp'], unit='ms')
-        ohlcv.set_index('date', inplace=True)
-        ohlcv = ohlcv[~ohlcv.index.duplicated(keep='first')]
-        del ohlcv['timestamp']
-        ohlcv = ohlcv.iloc[:-1]
-        file_path = self._get_csv_file_path(symbol, timeframe)
-        ohlcv.to_csv(file_path, header=True, index=True)
+        ohlcv, n_rows = self._get_ohlcv(symbol, timeframe, start_date, end_date)
+        ohlcv = ohlcv[:n_rows]
+        # first occurrence of every timestamp, in chronological order
+        timestamps, first_occurrences = np.unique(ohlcv[:, 0].astype(np.int64), return_index=True)
+        dates = pd.to_datetime(timestamps, unit='ms').rename('date')
+        ohlcv = pd.DataFrame(ohlcv[first_occurrences, 1:], index=dates,
+                             columns=['open', 'high', 'low', 'close', 'volume']).iloc[:-1]
+        file_path = self._get_file_path(symbol, timeframe)
+        ohlcv.to_parquet(file_path, engine='pyarrow', compression='zstd')
 
     def load(self, symbol: str, timeframe: str, start_date: Optional[str] = None,
              end_date: Optional[str] = None) -> pd.DataFrame:
         """
-        Loads OHLCV data from a CSV file for a given symbol and timeframe, optionally filtering by date range.
+        Loads OHLCV data from the Parquet file (or a legacy CSV file) for a given symbol and timeframe, optionally filtering by date range.
 
         :param symbol: Trading pair symbol.
         :param timeframe: Timeframe for the OHLCV data.
@@ -132,31 +146,41 @@ class DataManager:
         :return: A pandas DataFrame containing the OHLCV data.
         """
 
-        file_path = self._get_csv_file_path(symbol, timeframe)
+        file_path = self._get_file_path(symbol, timeframe)
+        legacy_file_path = self._get_file_path(symbol, timeframe, extension="csv")
 
-        if not file_path.exists():
+        if file_path.exists():
+            ohlcv_df = pd.read_parquet(file_path, engine='pyarrow')
+        elif legacy_file_path.exists():  # downloaded before the switch to Parquet
+            ohlcv_df = pd.read_csv(legacy_file_path, header=0, parse_dates=['date'], index_col='date')
+            if not ohlcv_df.index.is_monotonic_increasing:  # rows were stored in fetch order
+                ohlcv_df = ohlcv_df.sort_index()
+        else:
             raise FileNotFoundError(
                 f"The data file for {symbol} in timeframe {timeframe} does not exist. Please run .download() first.")
-        ohlcv_df = pd.read_csv(file_path, header=0, parse_dates=['date'], index_col='date')
 
         if ohlcv_df.empty:
             raise ValueError(f"The data file for {symbol} in timeframe {timeframe} is empty.")
 
+        # the index is sorted: its bounds are its first and last dates, and the range is sliced by binary search
+        index = ohlcv_df.index
+        first_date, last_date = index[0], index[-1]
+
         if not start_date:
-            start_date_dt = ohlcv_df.index.min()
+            start_date_dt = first_date
         else:
             start_date_dt = self._validate_date_format(start_date, timeframe)
         if not end_date:
-            end_date_dt = ohlcv_df.index.max()
+            end_date_dt = last_date
         else:
             end_date_dt = self._validate_date_format(end_date, timeframe)
 
-        if start_date_dt < ohlcv_df.index.min() or end_date_dt > ohlcv_df.index.max():
+        if start_date_dt < first_date or end_date_dt > last_date:
             raise ValueError(
                 "The requested date range is not fully covered by the available data. "
                 "Please adjust your dates or run .download() to update the data file.")
 
-        return ohlcv_df.loc[start_date_dt:end_date_dt]
+        return ohlcv_df.iloc[index.searchsorted(start_date_dt):index.searchsorted(end_date_dt, side='right')]
 
     def _check_support(self) -> None:
         if self.name not in EXCHANGES:
@@ -166,10 +190,10 @@ class DataManager:
     def _create_directory(path: Path) -> None:
         path.mkdir(parents=True, exist_ok=True)
 
-    def _get_csv_file_path(self, symbol: str, timeframe: str) -> Path:
+    def _get_file_path(self, symbol: str, timeframe: str, extension: str = "parquet") -> Path:
         timeframe_path = self.path.joinpath(timeframe)
         self._create_directory(timeframe_path)
-        file_name = f"{symbol.replace('/', '-').replace(':', '-')}.csv"
+        file_name = f"{symbol.replace('/', '-').replace(':', '-')}.{extension}"
         return timeframe_path.joinpath(file_name)
 
     @staticmethod
@@ -177,15 +201,29 @@ class DataManager:
         date_format = "%Y-%m-%d" if timeframe == '1d' else "%Y-%m-%d %H:%M:%S"
 
         try:
-            return datetime.strptime(date, date_format)
+            return _parse_date(date, date_format)
 
         except ValueError:
             raise ValueError(f"The date '{date}' does not match the expected format '{date_format}'.")
 
-    def _get_ohlcv(self, symbol: str, timeframe: str, start_date: datetime, end_date: datetime) -> List[List[Any]]:
+    @staticmethod
+    def _append_rows(buffer: np.ndarray, n_rows: int, rows: List[List[Any]]) -> Tuple[np.ndarray, int]:
+        rows = np.asarray(rows, dtype=np.float64)
+        if n_rows + len(rows) > len(buffer):
+            grown = np.empty((max(2 * len(buffer), n_rows + len(rows)), buffer.shape[1]), dtype=np.float64)
+            grown[:n_rows] = buffer[:n_rows]
+            buffer = grown
+        buffer[n_rows:n_rows + len(rows)] = rows
+        return buffer, n_rows + len(rows)
+
+    def _get_ohlcv(self, symbol: str, timeframe: str, start_date: datetime, end_date: datetime) -> Tuple[np.ndarray, int]:
         current_date_ms = int(start_date.timestamp() * 1000)
         end_date_ms = int(end_date.timestamp() * 1000)
-        ohlcv = []
+        # candles are copied batch by batch into a float64 buffer sized for the requested period (grown by doubling),
+        # returned along with the number of filled rows
+        expected_rows = max(end_date_ms - current_date_ms, 0) // TIMEFRAMES[timeframe]["interval_ms"]
+        ohlcv = np.empty((expected_rows + EXCHANGES[self.name]["limit_size_request"], 6), dtype=np.float64)
+        n_rows = 0
 
         if self.name == 'bitget':
             if ":" not in symbol:
@@ -203,7 +241,7 @@ class DataManager:
                 )
 
                 if fetched_data:
-                    ohlcv.extend(fetched_data)
+                    ohlcv, n_rows = self._append_rows(ohlcv, n_rows, fetched_data)
                     print(f"fetched ohlcv data for {symbol} from {datetime.fromtimestamp(current_date_ms / 1000).strftime("%Y-%m-%d %H:%M:%S")}")
                 else:
                     print(f"fetched ohlcv data for {symbol} from {datetime.fromtimestamp(current_date_ms / 1000).strftime("%Y-%m-%d %H:%M:%S")} (empty)")
@@ -211,19 +249,67 @@ class DataManager:
                 current_date_ms = min([current_date_ms + int(0.5*TIMEFRAMES[timeframe]["interval_ms"] * EXCHANGES[self.name]["limit_size_request"]), end_date_ms])
 
         else:
-            while current_date_ms < end_date_ms:
-                fetched_data = self.exchange.fetch_ohlcv(
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    since=current_date_ms,
-                    limit=EXCHANGES[self.name]["limit_size_request"]
-                )
+            batches = _run_sync(self._fetch_ohlcv_windows(symbol, timeframe, current_date_ms, end_date_ms))
+
+            for fetched_data in batches:
                 if fetched_data:
-                    ohlcv.extend(fetched_data)
-                    current_date_ms = fetched_data[-1][0] + 1
-                    print(f"fetched ohlcv data for {symbol} from {datetime.fromtimestamp(current_date_ms / 1000).strftime("%Y-%m-%d %H:%M:%S")}")
-                else:
-                    break
+                    ohlcv, n_rows = self._append_rows(ohlcv, n_rows, fetched_data)
 
 
-        return ohlcv
+        return ohlcv, n_rows
+
+    async def _fetch_ohlcv_windows(self, symbol: str, timeframe: str, start_date_ms: int,
+                                   end_date_ms: int) -> List[List[List[Any]]]:
+        exchange = getattr(ccxt.async_support, self.name)(config={'enableRateLimit': True})
+        try:
+            # the first window is fetched alone: before the symbol was listed, the exchange answers every window
+            # with its first candles, so the remaining windows start after the first candle actually returned
+            first_batch = await exchange.fetch_ohlcv(
+                symbol=symbol,
+                timeframe=timeframe,
+                since=start_date_ms,
+                limit=EXCHANGES[self.name]["limit_size_request"]
+            )
+            if not first_batch:
+                return []
+            batches = [first_batch]
+            print(f"fetched ohlcv data for {symbol} from {datetime.fromtimestamp(start_date_ms / 1000).strftime("%Y-%m-%d %H:%M:%S")}")
+
+            # one window per request, all known upfront so they can be fetched concurrently
+            window_ms = TIMEFRAMES[timeframe]["interval_ms"] * EXCHANGES[self.name]["limit_size_request"]
+            since_list = list(range(first_batch[-1][0] + 1, end_date_ms, window_ms))
+            for i in range(0, len(since_list), CONCURRENT_REQUESTS):
+                batches.extend(await asyncio.gather(*[
+                    exchange.fetch_ohlcv(
+                        symbol=symbol,
+                        timeframe=timeframe,
+                        since=since,
+                        limit=EXCHANGES[self.name]["limit_size_request"]
+                    )
+                    for since in since_list[i:i + CONCURRENT_REQUESTS]
+                ]))
+                print(f"fetched ohlcv data for {symbol} from {datetime.fromtimestamp(since_list[i] / 1000).strftime("%Y-%m-%d %H:%M:%S")}")
+        finally:
+            await exchange.close()
+        return batches
+
+
+def _parse_date(date: str, date_format: str) -> datetime:
+    # fast path for the usual zero padded dates, strptime still parses (or rejects) anything else
+    match = _DATE_PATTERNS[date_format].fullmatch(date)
+    if match:
+        try:
+            return datetime(*map(int, match.groups()))
+        except ValueError:
+            pass
+    return datetime.strptime(date, date_format)
+
+
+def _run_sync(coroutine: Coroutine) -> Any:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # an event loop is already running (e.g. in Jupyter), run the coroutine in its own loop on another thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()